@@ -1,44 +1,116 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File
+import os
+
+# Motor reads its thread pool size at import time; beyond the CPU count extra
+# workers only add contention on the hop between asyncio and pymongo
+os.environ.setdefault('MOTOR_MAX_WORKERS', str(os.cpu_count() or 4))
+
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, UploadFile, File
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 import socketio
-import os
+import asyncio
+import hashlib
+import math
+import re
+import secrets
+import time
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
-import uuid
 from datetime import datetime, timedelta
 import bcrypt
 import jwt
-from geopy.distance import geodesic
+import orjson
 import base64
+import binascii
 from bson import ObjectId
+from bson.errors import InvalidId
+from cachetools import TLRUCache, TTLCache
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, hmac
+from gridfs.errors import NoFile
+from pymongo.errors import DuplicateKeyError
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=50,
+    minPoolSize=10,
+    maxIdleTimeMS=60000,
+    compressors="zstd,zlib",
+    retryWrites=True
+)
 db = client[os.environ['DB_NAME']]
 
+# Message images are stored in GridFS rather than inline in message documents
+fs = AsyncIOMotorGridFSBucket(db)
+
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'nearby-connect-secret-key-12345')
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
 
-# Initialize Socket.IO
+# HMAC keyed with the JWT secret once; each verification works on a copy
+jwt_hmac = hmac.HMAC(JWT_SECRET.encode('utf-8'), hashes.SHA256())
+
+# Validated token cache: sha256(token) -> (user_id, exp). Entries expire with
+# the token itself, capped so deleted users lose access within the hour.
+TOKEN_CACHE_MAX_TTL_SECONDS = 3600
+token_cache = TLRUCache(
+    maxsize=10_000,
+    ttu=lambda key, value, now: min(value[1], now + TOKEN_CACHE_MAX_TTL_SECONDS),
+    timer=time.time
+)
+token_cache_locks = {}
+
+# Signup validation
+EMAIL_RE = re.compile(r'^[^@]+@[^@]+\.[^@]+$')
+PHONE_RE = re.compile(r'^\+?[\d\s\-\(\)]{10,15}$')
+
+# Nearby search
+METERS_PER_MILE = 1609.344
+ACTIVE_WINDOW = timedelta(minutes=30)
+
+# Location pings arriving within this window of the user's last stored
+# location, and within LOCATION_DEBOUNCE_METERS of it, are acknowledged
+# without writing (tracked per process: user_id -> (latitude, longitude))
+LOCATION_DEBOUNCE_SECONDS = int(os.environ.get('LOCATION_DEBOUNCE_SECONDS', '10'))
+LOCATION_DEBOUNCE_METERS = float(os.environ.get('LOCATION_DEBOUNCE_METERS', '25'))
+EARTH_RADIUS_M = 6_371_008.8
+recent_location_writes = TTLCache(maxsize=100_000, ttl=LOCATION_DEBOUNCE_SECONDS)
+
+# Messages
+MESSAGES_PAGE_SIZE = 100
+
+# orjson-backed stand-in for the json module python-socketio expects
+class OrjsonSocketIOJSON:
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+    
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
+# Initialize Socket.IO (set SIO_LOG=1 to log Socket.IO events; Engine.IO
+# packet logging stays off since it fires on every heartbeat)
 sio = socketio.AsyncServer(
     cors_allowed_origins="*",
-    logger=True,
-    engineio_logger=True
+    logger=os.environ.get('SIO_LOG') == '1',
+    engineio_logger=False,
+    json=OrjsonSocketIOJSON
 )
 
 # Create the main app
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -47,22 +119,27 @@ api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
 # Pydantic Models
+def new_id() -> str:
+    # Hex ObjectIds are shorter than UUID4 strings and roughly time-ordered,
+    # so "id" index entries are smaller and inserts append to the B-tree
+    return str(ObjectId())
+
 class UserCreate(BaseModel):
     name: str
     email: str
     phone: str
     
-    @validator('email')
+    @field_validator('email')
+    @classmethod
     def validate_email(cls, v):
-        import re
-        if not re.match(r'^[^@]+@[^@]+\.[^@]+$', v):
+        if not EMAIL_RE.match(v):
             raise ValueError('Invalid email format')
         return v
     
-    @validator('phone')
+    @field_validator('phone')
+    @classmethod
     def validate_phone(cls, v):
-        import re
-        if not re.match(r'^\+?[\d\s\-\(\)]{10,15}$', v):
+        if not PHONE_RE.match(v):
             raise ValueError('Invalid phone format')
         return v
 
@@ -72,7 +149,7 @@ class UserLogin(BaseModel):
     verification_code: str = None
 
 class User(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     name: str
     email: str
     phone: str
@@ -89,20 +166,22 @@ class LocationUpdate(BaseModel):
     longitude: float
     user_id: str
     
-    @validator('latitude')
+    @field_validator('latitude')
+    @classmethod
     def validate_latitude(cls, v):
         if not -90 <= v <= 90:
             raise ValueError('Latitude must be between -90 and 90')
         return v
     
-    @validator('longitude')
+    @field_validator('longitude')
+    @classmethod
     def validate_longitude(cls, v):
         if not -180 <= v <= 180:
             raise ValueError('Longitude must be between -180 and 180')
         return v
 
 class Location(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     user_id: str
     latitude: float
     longitude: float
@@ -114,11 +193,11 @@ class MessageCreate(BaseModel):
     image_data: Optional[str] = None  # base64 encoded image
 
 class Message(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     sender_id: str
     recipient_ids: List[str]
     content: str
-    image_data: Optional[str] = None
+    image_id: Optional[str] = None  # GridFS file id
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     read_by: List[str] = Field(default_factory=list)
 
@@ -132,14 +211,21 @@ class UserPreferences(BaseModel):
 
 # Helper Functions
 def create_verification_code():
-    import random
-    return str(random.randint(100000, 999999))
+    return f"{secrets.randbelow(900_000) + 100_000:06d}"
+
+# bcrypt is deliberately slow, so run it in a worker thread to keep the event loop free
+async def hash_password(password: str) -> str:
+    hashed = await asyncio.to_thread(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt())
+    return hashed.decode('utf-8')
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def verify_password(password: str, hashed: str) -> bool:
+    return await asyncio.to_thread(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+def approx_distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    # Equirectangular approximation; accurate to well under a meter at debounce distances
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * EARTH_RADIUS_M
 
 def create_jwt_token(user_id: str) -> str:
     expiration = datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
@@ -149,27 +235,94 @@ def create_jwt_token(user_id: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-async def verify_jwt_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def base64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+def decode_jwt_token(token: str) -> dict:
+    # HS256-only equivalent of jwt.decode that reuses the keyed HMAC
+    try:
+        signing_input, _, signature = token.rpartition('.')
+        header_segment, _, payload_segment = signing_input.partition('.')
+        header = orjson.loads(base64url_decode(header_segment))
+        if not isinstance(header, dict) or header.get("alg") != JWT_ALGORITHM:
+            raise jwt.InvalidAlgorithmError("The specified alg value is not allowed")
+        
+        verifier = jwt_hmac.copy()
+        verifier.update(signing_input.encode('ascii'))
+        verifier.verify(base64url_decode(signature))
+        
+        payload = orjson.loads(base64url_decode(payload_segment))
+    except (ValueError, InvalidSignature):
+        raise jwt.InvalidTokenError("Invalid token")
+    
+    if not isinstance(payload, dict) or not isinstance(payload.get("exp"), (int, float)):
+        raise jwt.InvalidTokenError("Invalid token")
+    if payload["exp"] <= time.time():
+        raise jwt.ExpiredSignatureError("Signature has expired")
+    
+    return payload
+
+async def validate_jwt_token(token: str):
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = decode_jwt_token(token)
         user_id = payload.get("user_id")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
         
         # Check if user exists
-        user = await db.users.find_one({"id": user_id})
+        user = await db.users.find_one({"id": user_id}, {"_id": 0, "id": 1})
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         
-        return user_id
+        return user_id, payload["exp"]
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-def calculate_distance_miles(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    return geodesic((lat1, lon1), (lat2, lon2)).miles
+async def authenticate_token(token: str) -> str:
+    key = hashlib.sha256(token.encode('utf-8')).digest()
+    
+    cached = token_cache.get(key)
+    if cached is not None:
+        return cached[0]
+    
+    # Serialize cold lookups for the same token so concurrent requests
+    # validate it once instead of all hitting the database
+    lock = token_cache_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        try:
+            cached = token_cache.get(key)
+            if cached is not None:
+                return cached[0]
+            
+            # Failed validations raise and are never cached
+            user_id, exp = await validate_jwt_token(token)
+            token_cache[key] = (user_id, exp)
+            return user_id
+        finally:
+            # A waiter on an already-popped lock must not remove a newer
+            # lock that another coroutine now holds for the same token
+            if token_cache_locks.get(key) is lock:
+                del token_cache_locks[key]
+
+async def verify_jwt_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await authenticate_token(credentials.credentials)
+
+async def store_image(image_data: str) -> str:
+    # Accept both raw base64 and data URLs ("data:image/png;base64,...")
+    content_type = "application/octet-stream"
+    if image_data.startswith("data:"):
+        header, _, image_data = image_data.partition(",")
+        content_type = header[len("data:"):].split(";")[0] or content_type
+    
+    try:
+        raw = base64.b64decode(image_data, validate=True)
+    except binascii.Error:
+        raise HTTPException(status_code=400, detail="Invalid image data")
+    
+    file_id = await fs.upload_from_stream("image", raw, metadata={"content_type": content_type})
+    return str(file_id)
 
 # API Routes
 @api_router.post("/auth/signup")
@@ -190,7 +343,11 @@ async def signup(user_data: UserCreate):
         verified=False
     )
     
-    await db.users.insert_one(user.dict())
+    # The unique email index settles signups that race past the check above
+    try:
+        await db.users.insert_one(user.model_dump(mode="python", exclude_none=True))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="User already exists")
     
     # In a real app, send verification code via email/SMS
     # For MVP, we'll just return it
@@ -255,7 +412,10 @@ async def login(login_data: UserLogin):
 
 @api_router.get("/profile")
 async def get_profile(current_user_id: str = Depends(verify_jwt_token)):
-    user = await db.users.find_one({"id": current_user_id})
+    user = await db.users.find_one(
+        {"id": current_user_id},
+        {"_id": 0, "id": 1, "name": 1, "email": 1, "phone": 1, "preferences": 1, "profile_image": 1}
+    )
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -278,91 +438,185 @@ async def update_profile(profile_data: dict, current_user_id: str = Depends(veri
 
 @api_router.post("/location")
 async def update_location(location_data: LocationUpdate, current_user_id: str = Depends(verify_jwt_token)):
+    # A ping that has not really moved since the last write is dropped, and
+    # the response says so and echoes the location that is stored
+    last = recent_location_writes.get(current_user_id)
+    if last is not None and approx_distance_m(
+        last[0], last[1], location_data.latitude, location_data.longitude
+    ) < LOCATION_DEBOUNCE_METERS:
+        return {
+            "message": "Location already up to date",
+            "debounced": True,
+            "latitude": last[0],
+            "longitude": last[1]
+        }
+    recent_location_writes[current_user_id] = (location_data.latitude, location_data.longitude)
+    
     location = Location(
         user_id=current_user_id,
         latitude=location_data.latitude,
         longitude=location_data.longitude
     )
     
-    # Update or insert location
-    await db.locations.update_one(
-        {"user_id": current_user_id},
-        {"$set": location.dict()},
-        upsert=True
-    )
+    # Store a GeoJSON point alongside the raw coordinates for the 2dsphere index
+    location_doc = location.model_dump(mode="python", exclude_none=True)
+    location_doc["geo"] = {
+        "type": "Point",
+        "coordinates": [location.longitude, location.latitude]
+    }
     
-    # Update user's last active time
-    await db.users.update_one(
-        {"id": current_user_id},
-        {"$set": {"last_active": datetime.utcnow()}}
-    )
+    # Update or insert location; its timestamp doubles as the user's last
+    # active time, so a ping is a single write
+    try:
+        await db.locations.update_one(
+            {"user_id": current_user_id},
+            {"$set": location_doc},
+            upsert=True
+        )
+    except Exception:
+        # Nothing was stored, so don't debounce the client's retries
+        recent_location_writes.pop(current_user_id, None)
+        raise
     
     return {"message": "Location updated successfully"}
 
 @api_router.post("/users/nearby")
 async def get_nearby_users(request: NearbyUsersRequest, current_user_id: str = Depends(verify_jwt_token)):
-    # Get all active users (active in last 30 minutes)
-    cutoff_time = datetime.utcnow() - timedelta(minutes=30)
-    active_users = await db.users.find(
-        {
-            "id": {"$ne": current_user_id},
-            "last_active": {"$gte": cutoff_time}
-        }
-    ).to_list(1000)
-    
-    nearby_users = []
-    
-    for user in active_users:
-        # Get user's latest location
-        location = await db.locations.find_one({"user_id": user["id"]})
-        if location:
-            distance = calculate_distance_miles(
-                request.latitude, request.longitude,
-                location["latitude"], location["longitude"]
-            )
-            
-            if distance <= request.radius_miles:
-                nearby_users.append({
-                    "id": user["id"],
-                    "name": user["name"],
-                    "latitude": location["latitude"],
-                    "longitude": location["longitude"],
-                    "distance_miles": round(distance, 2),
-                    "last_active": user["last_active"]
-                })
+    # Only include users active in the last 30 minutes
+    cutoff_time = datetime.utcnow() - ACTIVE_WINDOW
+    
+    # Resolve locations within the radius via the 2dsphere index, join their
+    # users and compute distances in a single round-trip. The 2dsphere index
+    # already buckets points by covering cell, and the $geoNear query drops
+    # the caller's own and stale locations during that scan, before any join work.
+    # The plain localField/foreignField $lookup works on every server version;
+    # the final $project keeps only the joined user's id and name.
+    pipeline = [
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [request.longitude, request.latitude]},
+            "distanceField": "distance_m",
+            "maxDistance": request.radius_miles * METERS_PER_MILE,
+            "query": {
+                "user_id": {"$ne": current_user_id},
+                "timestamp": {"$gte": cutoff_time}
+            },
+            "spherical": True
+        }},
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_id",
+            "foreignField": "id",
+            "as": "u"
+        }},
+        {"$unwind": "$u"},
+        {"$project": {
+            "_id": 0,
+            "id": "$u.id",
+            "name": "$u.name",
+            "latitude": 1,
+            "longitude": 1,
+            "distance_miles": {"$round": [{"$divide": ["$distance_m", METERS_PER_MILE]}, 2]},
+            "last_active": "$timestamp"
+        }}
+    ]
+    nearby_users = await db.locations.aggregate(pipeline).to_list(1000)
     
     return {"nearby_users": nearby_users}
 
 @api_router.post("/messages")
 async def send_message(message_data: MessageCreate, current_user_id: str = Depends(verify_jwt_token)):
+    image_id = None
+    if message_data.image_data:
+        image_id = await store_image(message_data.image_data)
+    
     message = Message(
         sender_id=current_user_id,
         recipient_ids=message_data.recipient_ids,
         content=message_data.content,
-        image_data=message_data.image_data
+        image_id=image_id
     )
     
-    result = await db.messages.insert_one(message.dict())
+    result = await db.messages.insert_one(message.model_dump(mode="python", exclude_none=True))
     
-    # Emit real-time message via Socket.IO
-    await sio.emit('new_message', {
+    # Emit real-time message via Socket.IO to each recipient's private room
+    payload = {
         'id': message.id,
         'sender_id': current_user_id,
         'content': message.content,
-        'image_data': message.image_data,
+        'image_id': message.image_id,
         'timestamp': message.timestamp.isoformat()
-    }, room='messages')
+    }
+    for recipient_id in message.recipient_ids:
+        await sio.emit('new_message', payload, room=f'user:{recipient_id}')
     
     return {"message": "Message sent successfully", "message_id": message.id}
 
+@api_router.get("/messages/{message_id}/image")
+async def get_message_image(message_id: str, current_user_id: str = Depends(verify_jwt_token)):
+    message = await db.messages.find_one(
+        {
+            "id": message_id,
+            "$or": [
+                {"sender_id": current_user_id},
+                {"recipient_ids": current_user_id}
+            ]
+        },
+        {"image_id": 1, "_id": 0}
+    )
+    if not message or not message.get("image_id"):
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    try:
+        grid_out = await fs.open_download_stream(ObjectId(message["image_id"]))
+    except (InvalidId, NoFile):
+        raise HTTPException(status_code=404, detail="Image not found")
+    content_type = (grid_out.metadata or {}).get("content_type", "application/octet-stream")
+    
+    async def read_chunks():
+        while True:
+            chunk = await grid_out.readchunk()
+            if not chunk:
+                break
+            yield chunk
+    
+    return StreamingResponse(read_chunks(), media_type=content_type)
+
 @api_router.get("/messages")
-async def get_messages(current_user_id: str = Depends(verify_jwt_token)):
+async def get_messages(
+    before: Optional[datetime] = None,
+    before_id: Optional[str] = None,
+    limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=MESSAGES_PAGE_SIZE),
+    current_user_id: str = Depends(verify_jwt_token)
+):
+    # Each $or branch matches one of the (sender_id|recipient_ids, timestamp, id)
+    # indexes; "before"/"before_id" page backwards from the previous
+    # response's next_cursor, with id breaking timestamp ties
+    if before_id is not None and before is None:
+        raise HTTPException(status_code=400, detail="before_id requires before")
+    
+    sent = {"sender_id": current_user_id}
+    received = {"recipient_ids": current_user_id}
+    if before is not None:
+        if before_id is not None:
+            older = {"$or": [
+                {"timestamp": {"$lt": before}},
+                {"timestamp": before, "id": {"$lt": before_id}}
+            ]}
+        else:
+            older = {"timestamp": {"$lt": before}}
+        sent.update(older)
+        received.update(older)
+    
     messages = await db.messages.find(
-        {"$or": [
-            {"sender_id": current_user_id},
-            {"recipient_ids": current_user_id}
-        ]}
-    ).sort("timestamp", -1).limit(100).to_list(100)
+        {"$or": [sent, received]}
+    ).sort([("timestamp", -1), ("id", -1)]).limit(limit).to_list(limit)
+    
+    # Resolve all sender names in a single query
+    sender_ids = list({message["sender_id"] for message in messages})
+    senders = {
+        user["id"]: user["name"]
+        async for user in db.users.find({"id": {"$in": sender_ids}}, {"id": 1, "name": 1, "_id": 0})
+    }
     
     # Convert MongoDB documents to JSON-serializable format
     serialized_messages = []
@@ -372,9 +626,8 @@ async def get_messages(current_user_id: str = Depends(verify_jwt_token)):
             del message["_id"]
         
         # Get sender names
-        sender = await db.users.find_one({"id": message["sender_id"]})
-        if sender:
-            message["sender_name"] = sender["name"]
+        if message["sender_id"] in senders:
+            message["sender_name"] = senders[message["sender_id"]]
         
         # Convert datetime to ISO string if present
         if "timestamp" in message and hasattr(message["timestamp"], "isoformat"):
@@ -382,7 +635,16 @@ async def get_messages(current_user_id: str = Depends(verify_jwt_token)):
         
         serialized_messages.append(message)
     
-    return {"messages": serialized_messages}
+    # A full page means there may be older messages; the cursor's keys are
+    # the query parameters for the next page
+    next_cursor = None
+    if len(serialized_messages) == limit:
+        next_cursor = {
+            "before": serialized_messages[-1]["timestamp"],
+            "before_id": serialized_messages[-1]["id"]
+        }
+    
+    return {"messages": serialized_messages, "next_cursor": next_cursor}
 
 @api_router.put("/preferences")
 async def update_preferences(preferences: UserPreferences, current_user_id: str = Depends(verify_jwt_token)):
@@ -394,13 +656,26 @@ async def update_preferences(preferences: UserPreferences, current_user_id: str
 
 # Socket.IO Events
 @sio.event
-async def connect(sid, environ):
-    print(f"Client {sid} connected")
-    await sio.enter_room(sid, 'messages')
+async def connect(sid, environ, auth=None):
+    logger.debug("Client %s connected", sid)
+    
+    # Clients that authenticate with {"token": ...} join their private room
+    # and receive the messages addressed to them
+    if auth is not None and not isinstance(auth, dict):
+        raise socketio.exceptions.ConnectionRefusedError('auth must be an object like {"token": ...}')
+    token = (auth or {}).get('token')
+    if token:
+        try:
+            user_id = await authenticate_token(token)
+        except HTTPException as e:
+            raise socketio.exceptions.ConnectionRefusedError(e.detail)
+        
+        await sio.save_session(sid, {'user_id': user_id})
+        await sio.enter_room(sid, f'user:{user_id}')
 
 @sio.event
 async def disconnect(sid):
-    print(f"Client {sid} disconnected")
+    logger.debug("Client %s disconnected", sid)
 
 @sio.event
 async def join_location_updates(sid, data):
@@ -429,6 +704,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await db.users.create_index("id", unique=True)
+    await db.users.create_index("email", unique=True)
+    await db.locations.create_index("user_id", unique=True)
+    await db.locations.create_index([("geo", "2dsphere")])
+    # Expire locations once their user leaves the active window, so the
+    # collection only ever holds the active cohort that nearby search scans
+    await db.locations.create_index("timestamp", expireAfterSeconds=int(ACTIVE_WINDOW.total_seconds()))
+    await db.messages.create_index([("sender_id", 1), ("timestamp", -1), ("id", -1)])
+    await db.messages.create_index([("recipient_ids", 1), ("timestamp", -1), ("id", -1)])
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
@@ -5,63 +5,322 @@ Tests all authentication, location, and messaging endpoints
 """
 
 import requests
-import json
-import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import ijson
+import base64
+import hashlib
+import hmac
+import os
 import random
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Configuration
 BASE_URL = "https://radius-chat.preview.emergentagent.com/api"
 HEADERS = {"Content-Type": "application/json"}
 
+# Upper bound on in-flight requests; the session keeps exactly this many
+# keep-alive connections so concurrent tests never open throwaway ones.
+# Override with BACKEND_TEST_WORKERS to widen or narrow the fan-out.
+MAX_CONCURRENCY = int(os.environ.get("BACKEND_TEST_WORKERS", "8"))
+
+# Users created around the first one for the nearby and messaging tests;
+# raise BACKEND_TEST_NEARBY_USERS for a quick load sanity check
+NEARBY_USER_COUNT = int(os.environ.get("BACKEND_TEST_NEARBY_USERS", "1"))
+
+# Static request payloads, built once at import
+PRIMARY_LOCATION = {"latitude": 37.7749, "longitude": -122.4194}  # San Francisco coordinates
+PROFILE_IMAGE_B64 = "data:image/jpeg;base64,/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAAYEBQYFBAYGBQYHBwYIChAKCgkJChQODwwQFxQYGBcUFhYaHSUfGhsjHBYWICwgIyYnKSopGR8tMC0oMCUoKSj/2wBDAQcHBwoIChMKChMoGhYaKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCj/wAARCAABAAEDASIAAhEBAxEB/8QAFQABAQAAAAAAAAAAAAAAAAAAAAv/xAAUEAEAAAAAAAAAAAAAAAAAAAAA/8QAFQEBAQAAAAAAAAAAAAAAAAAAAAX/xAAUEQEAAAAAAAAAAAAAAAAAAAAA/9oADAMBAAIRAxEAPwCdABmX/9k="
+# Small base64 encoded test image
+TEST_PNG_B64 = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+TEST_PNG_BYTES = base64.b64decode(TEST_PNG_B64.partition(",")[2])
+PROFILE_UPDATE_BODY = orjson.dumps({
+    "preferences": ["hiking", "photography", "coffee"],
+    "profile_image": PROFILE_IMAGE_B64
+})
+INVALID_EMAIL_BODY = orjson.dumps({
+    "name": "Invalid User",
+    "email": "invalid-email",
+    "phone": "+1234567890"
+})
+NEARBY_REQUEST_BODY = orjson.dumps({**PRIMARY_LOCATION, "radius_miles": 2.0})
+PREFERENCES_BODY = orjson.dumps({
+    "preferences": ["music", "travel", "technology", "fitness"]
+})
+
+# Server's default JWT secret: forged tokens are signed with it so the
+# expiry and algorithm checks are what reject them, not just the signature
+DEFAULT_JWT_SECRET = "nearby-connect-secret-key-12345"
+
+def b64url(data):
+    """Unpadded base64url, as used in JWT segments"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def signed_token(header, payload, digestmod=hashlib.sha256):
+    """JWT with the given header and payload, HMAC-signed with DEFAULT_JWT_SECRET"""
+    signing_input = f"{b64url(orjson.dumps(header))}.{b64url(orjson.dumps(payload))}"
+    signature = hmac.new(DEFAULT_JWT_SECRET.encode(), signing_input.encode(), digestmod).digest()
+    return f"{signing_input}.{b64url(signature)}"
+
+# Messages the pagination test sends at once, so some share a timestamp,
+# and the page size it walks them with
+PAGINATION_BURST = 6
+PAGINATION_PAGE_SIZE = 2
+# GET /messages page size cap on the server
+MESSAGES_PAGE_SIZE = 100
+
+# (connect, read) timeout in seconds so a hung backend cannot stall the run
+REQUEST_TIMEOUT = (3.05, 10)
+
+# Failure reports only need the start of the body
+RESPONSE_EXCERPT_BYTES = 512
+
+def response_excerpt(response):
+    """First RESPONSE_EXCERPT_BYTES of the body, decoded without charset sniffing"""
+    return response.content[:RESPONSE_EXCERPT_BYTES].decode("utf-8", "replace")
+
+# BACKEND_MOCK=1 replays the responses recorded by the last live run
+# instead of touching the network; every live run re-records them. The
+# recording holds live credentials (the verify and login bearer tokens and
+# the cached users' tokens), so fixtures/ is gitignored and must not be shared.
+BACKEND_MOCK = os.environ.get("BACKEND_MOCK") == "1"
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "backend_responses.json")
+
+# Nearby test users verified by earlier runs, keyed by BASE_URL
+USER_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".backend_test_cache.json")
+
+# Bumped whenever fixture_key changes, so stale recordings are re-recorded
+# instead of silently missing every lookup
+FIXTURE_KEY_VERSION = 2
+
+def fixture_key(request):
+    """Key a recorded response by method, URL, Authorization and the key-sorted JSON body"""
+    body = request.body
+    if isinstance(body, str):
+        body = body.encode()
+    if body:
+        try:
+            body = orjson.dumps(orjson.loads(body), option=orjson.OPT_SORT_KEYS)
+        except orjson.JSONDecodeError:
+            pass
+    # The same request with and without a token (or with another user's)
+    # gets a different answer; hash the header so no token ends up in a key
+    auth = request.headers.get("Authorization", "").encode()
+    return (
+        f"{request.method} {request.url} "
+        f"{hashlib.sha256(auth).hexdigest()[:16]} {hashlib.sha256(body or b'').hexdigest()}"
+    )
+
+def replay_mock(fixtures):
+    """RequestsMock that answers every request from the recorded fixtures"""
+    import responses
+    
+    recorded = fixtures["responses"]
+    
+    def replay(request):
+        key = fixture_key(request)
+        entry = recorded.get(key)
+        if entry is None:
+            raise requests.exceptions.ConnectionError(f"No recorded response for {key}")
+        content_type = entry.get("content_type", "application/json")
+        if "body_b64" in entry:
+            return entry["status"], {"Content-Type": content_type}, base64.b64decode(entry["body_b64"])
+        return entry["status"], {"Content-Type": content_type}, entry["body"]
+    
+    mock = responses.RequestsMock(assert_all_requests_are_fired=False)
+    for method, url in {(entry["method"], entry["url"]) for entry in recorded.values()}:
+        mock.add_callback(method, url, callback=replay)
+    return mock
+
+def fixture_body(content, content_type):
+    """Recorded form of a body: JSON and text as-is, anything else (images) as base64"""
+    if content_type.startswith(("application/json", "text/")):
+        return {"body": content.decode("utf-8", "replace")}
+    return {"body_b64": base64.b64encode(content).decode("ascii")}
+
+class RecordingReader:
+    """File-like view of a streamed body that keeps a copy of what is read"""
+    
+    def __init__(self, raw):
+        self.raw = raw
+        self.chunks = []
+    
+    def read(self, amt=None):
+        data = self.raw.read(amt)
+        self.chunks.append(data)
+        return data
+    
+    def close(self):
+        self.raw.close()
+    
+    def release_conn(self):
+        self.raw.release_conn()
+
+class TimeoutSession(requests.Session):
+    """Session that applies REQUEST_TIMEOUT unless a call passes its own"""
+    
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        return super().request(*args, **kwargs)
+
 class NearbyConnectTester:
     def __init__(self):
         self.base_url = BASE_URL
-        self.headers = HEADERS.copy()
+        # Unique per run so concurrent signups never collide on email
+        self.run_id = uuid.uuid4().hex[:12]
+        
+        # One pooled session so every test reuses the same keep-alive
+        # connection instead of paying a TCP+TLS handshake per request
+        self.session = TimeoutSession()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=MAX_CONCURRENCY,
+            pool_block=True,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[500, 502, 503, 504],
+                allowed_methods=frozenset(["GET", "POST", "PUT"]),
+                raise_on_status=False
+            )
+        )
+        self.session.mount("https://", adapter)
+        
+        # Live runs record every response for BACKEND_MOCK replays; a replay
+        # reuses the recorded run_id so request bodies hash the same
+        self._recorded_responses = {}
+        self._fixtures = None
+        # User cache contents this run started from, saved with the fixtures
+        self._cached_users = None
+        if BACKEND_MOCK:
+            with open(FIXTURES_PATH, "rb") as f:
+                self._fixtures = orjson.loads(f.read())
+            if self._fixtures.get("key_version") != FIXTURE_KEY_VERSION:
+                sys.exit(f"{FIXTURES_PATH} was recorded with an older key format; re-record it with a live run")
+            self.run_id = self._fixtures["run_id"]
+        else:
+            self.session.hooks["response"].append(self._record_response)
+        
         self.test_users = []
         self.auth_tokens = {}
+        # Users in the order they were verified; the first is the primary user
+        self.primary_user_id = None
+        self.user_order = []
+        # Per-user Authorization header, built once when the token arrives;
+        # Content-Type comes from the session defaults
+        self.auth_headers = {}
+        # First user's location update, sent by create_users
+        self.primary_location_response = None
         self.test_results = {
             "passed": 0,
             "failed": 0,
             "errors": []
         }
+        # Guards test_results and output; tests within a phase run concurrently
+        self._lock = threading.Lock()
+        # Report lines, written out once at the end of run_all_tests
+        self._log_lines = []
+    
+    def set_auth_token(self, user_id, token):
+        """Store a user's token and its Authorization header"""
+        with self._lock:
+            if user_id not in self.auth_tokens:
+                self.user_order.append(user_id)
+                if self.primary_user_id is None:
+                    self.primary_user_id = user_id
+            self.auth_tokens[user_id] = token
+            self.auth_headers[user_id] = {"Authorization": f"Bearer {token}"}
+    
+    def _record_response(self, response, *args, **kwargs):
+        """Session response hook that keeps each response as a replay fixture"""
+        request = response.request
+        key = fixture_key(request)
+        content_type = response.headers.get("Content-Type", "application/json")
+        if kwargs.get("stream"):
+            # Reading .content here would drain a stream the test still has
+            # to parse, so copy the body as the test reads it instead
+            response.raw.decode_content = True
+            response.raw = RecordingReader(response.raw)
+            body = {"body": response.raw}
+        else:
+            body = fixture_body(response.content, content_type)
+        with self._lock:
+            self._recorded_responses[key] = {
+                "method": request.method,
+                "url": request.url,
+                "status": response.status_code,
+                "content_type": content_type,
+                **body
+            }
+        return response
+    
+    def save_fixtures(self):
+        """Write the responses recorded on this live run to FIXTURES_PATH"""
+        if not self._recorded_responses:
+            return
+        for entry in self._recorded_responses.values():
+            if isinstance(entry.get("body"), RecordingReader):
+                entry.update(fixture_body(b"".join(entry.pop("body").chunks), entry["content_type"]))
+        os.makedirs(os.path.dirname(FIXTURES_PATH), exist_ok=True)
+        with open(FIXTURES_PATH, "wb") as f:
+            f.write(orjson.dumps(
+                {
+                    "key_version": FIXTURE_KEY_VERSION,
+                    "run_id": self.run_id,
+                    "cached_users": self._cached_users,
+                    "responses": self._recorded_responses
+                },
+                option=orjson.OPT_INDENT_2
+            ))
+    
+    def _post_json(self, url, body, headers=None):
+        """POST body encoded with orjson (Content-Type is a session default)"""
+        return self.session.post(url, data=orjson.dumps(body), headers=headers)
     
     def log_result(self, test_name, success, message="", response=None):
         """Log test results"""
-        status = "✅ PASS" if success else "❌ FAIL"
-        print(f"{status}: {test_name}")
-        if message:
-            print(f"   {message}")
-        if response and not success:
-            print(f"   Response: {response.status_code} - {response.text}")
-        
-        if success:
-            self.test_results["passed"] += 1
-        else:
-            self.test_results["failed"] += 1
-            self.test_results["errors"].append({
-                "test": test_name,
-                "message": message,
-                "response": response.text if response else None
-            })
-        print()
+        with self._lock:
+            status = "✅ PASS" if success else "❌ FAIL"
+            lines = [f"{status}: {test_name}"]
+            if message:
+                lines.append(f"   {message}")
+            
+            if success:
+                self.test_results["passed"] += 1
+            else:
+                # Response.__bool__ is .ok, so test against None to keep 4xx bodies
+                body = response_excerpt(response) if response is not None else None
+                if response is not None:
+                    lines.append(f"   Response: {response.status_code} - {body}")
+                self.test_results["failed"] += 1
+                self.test_results["errors"].append({
+                    "test": test_name,
+                    "message": message,
+                    "response": body
+                })
+            lines.append("")
+            self._log_lines.extend(lines)
     
     def test_user_signup(self):
         """Test user registration endpoint"""
-        print("🔐 Testing Authentication System...")
-        
         # Test valid signup
         test_user = {
             "name": "Alice Johnson",
-            "email": f"alice.test.{int(time.time())}@example.com",
+            "email": f"alice.test.{self.run_id}.a@example.com",
             "phone": "+1234567890"
         }
         
         try:
-            response = requests.post(f"{self.base_url}/auth/signup", json=test_user, headers=self.headers)
+            response = self._post_json(f"{self.base_url}/auth/signup", test_user)
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if "user_id" in data and "verification_code" in data:
                     self.test_users.append({
                         "user_data": test_user,
@@ -79,14 +338,8 @@ class NearbyConnectTester:
     def test_invalid_signup(self):
         """Test signup with invalid data"""
         # Test invalid email
-        invalid_user = {
-            "name": "Invalid User",
-            "email": "invalid-email",
-            "phone": "+1234567890"
-        }
-        
         try:
-            response = requests.post(f"{self.base_url}/auth/signup", json=invalid_user, headers=self.headers)
+            response = self.session.post(f"{self.base_url}/auth/signup", data=INVALID_EMAIL_BODY)
             if response.status_code == 422:  # Validation error
                 self.log_result("Invalid Email Validation", True, "Correctly rejected invalid email")
             else:
@@ -107,12 +360,12 @@ class NearbyConnectTester:
         }
         
         try:
-            response = requests.post(f"{self.base_url}/auth/verify", json=verification_data, headers=self.headers)
+            response = self._post_json(f"{self.base_url}/auth/verify", verification_data)
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if "token" in data and "user" in data:
-                    self.auth_tokens[user["user_id"]] = data["token"]
+                    self.set_auth_token(user["user_id"], data["token"])
                     self.log_result("User Verification", True, f"User verified successfully, token received")
                 else:
                     self.log_result("User Verification", False, "Missing token or user data in response", response)
@@ -133,7 +386,7 @@ class NearbyConnectTester:
         }
         
         try:
-            response = requests.post(f"{self.base_url}/auth/verify", json=invalid_verification, headers=self.headers)
+            response = self._post_json(f"{self.base_url}/auth/verify", invalid_verification)
             if response.status_code == 400:
                 self.log_result("Invalid Verification Code", True, "Correctly rejected invalid verification code")
             else:
@@ -153,12 +406,13 @@ class NearbyConnectTester:
         }
         
         try:
-            response = requests.post(f"{self.base_url}/auth/login", json=login_data, headers=self.headers)
+            response = self._post_json(f"{self.base_url}/auth/login", login_data)
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if "token" in data and "user" in data:
-                    self.auth_tokens[user["user_id"]] = data["token"]
+                    # Keep the token from verification: tests in this phase
+                    # are already using it, so swapping it here would race them
                     self.log_result("User Login", True, "Login successful, token received")
                 else:
                     self.log_result("User Login", False, "Missing token or user data in response", response)
@@ -173,16 +427,14 @@ class NearbyConnectTester:
             self.log_result("Profile Access", False, "No auth tokens available")
             return
         
-        user_id = list(self.auth_tokens.keys())[0]
-        token = self.auth_tokens[user_id]
-        auth_headers = self.headers.copy()
-        auth_headers["Authorization"] = f"Bearer {token}"
+        user_id = self.primary_user_id
+        auth_headers = self.auth_headers[user_id]
         
         try:
-            response = requests.get(f"{self.base_url}/profile", headers=auth_headers)
+            response = self.session.get(f"{self.base_url}/profile", headers=auth_headers)
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if "id" in data and "name" in data and "email" in data:
                     self.log_result("Profile Access", True, f"Profile retrieved for user: {data['name']}")
                 else:
@@ -198,18 +450,11 @@ class NearbyConnectTester:
             self.log_result("Profile Update", False, "No auth tokens available")
             return
         
-        user_id = list(self.auth_tokens.keys())[0]
-        token = self.auth_tokens[user_id]
-        auth_headers = self.headers.copy()
-        auth_headers["Authorization"] = f"Bearer {token}"
-        
-        update_data = {
-            "preferences": ["hiking", "photography", "coffee"],
-            "profile_image": "data:image/jpeg;base64,/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAAYEBQYFBAYGBQYHBwYIChAKCgkJChQODwwQFxQYGBcUFhYaHSUfGhsjHBYWICwgIyYnKSopGR8tMC0oMCUoKSj/2wBDAQcHBwoIChMKChMoGhYaKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCgoKCj/wAARCAABAAEDASIAAhEBAxEB/8QAFQABAQAAAAAAAAAAAAAAAAAAAAv/xAAUEAEAAAAAAAAAAAAAAAAAAAAA/8QAFQEBAQAAAAAAAAAAAAAAAAAAAAX/xAAUEQEAAAAAAAAAAAAAAAAAAAAA/9oADAMBAAIRAxEAPwCdABmX/9k="
-        }
+        user_id = self.primary_user_id
+        auth_headers = self.auth_headers[user_id]
         
         try:
-            response = requests.put(f"{self.base_url}/profile", json=update_data, headers=auth_headers)
+            response = self.session.put(f"{self.base_url}/profile", data=PROFILE_UPDATE_BODY, headers=auth_headers)
             
             if response.status_code == 200:
                 self.log_result("Profile Update", True, "Profile updated successfully")
@@ -221,7 +466,7 @@ class NearbyConnectTester:
     def test_unauthorized_access(self):
         """Test accessing protected endpoints without token"""
         try:
-            response = requests.get(f"{self.base_url}/profile", headers=self.headers)
+            response = self.session.get(f"{self.base_url}/profile")
             if response.status_code == 401 or response.status_code == 403:
                 self.log_result("Unauthorized Access Protection", True, "Correctly blocked unauthorized access")
             else:
@@ -229,27 +474,59 @@ class NearbyConnectTester:
         except Exception as e:
             self.log_result("Unauthorized Access Protection", False, f"Exception: {str(e)}")
     
+    def test_invalid_tokens(self):
+        """Test that forged and malformed tokens are rejected with 401"""
+        if not self.auth_tokens:
+            self.log_result("Invalid Token Rejection", False, "No auth tokens available")
+            return
+        
+        user_id = self.primary_user_id
+        
+        try:
+            header_segment, payload_segment, signature_segment = self.auth_tokens[user_id].split(".")
+            payload = base64.urlsafe_b64decode(payload_segment + "=" * (-len(payload_segment) % 4))
+            tampered = payload[:-1] + bytes([payload[-1] ^ 0x01])
+            cases = [
+                ("Tampered Payload", f"{header_segment}.{b64url(tampered)}.{signature_segment}"),
+                ("alg none", f"{b64url(orjson.dumps({'alg': 'none', 'typ': 'JWT'}))}.{payload_segment}."),
+                ("HS512", signed_token({"alg": "HS512", "typ": "JWT"}, orjson.loads(payload), hashlib.sha512)),
+                # Fixed exp so replays send the same token
+                ("Expired", signed_token({"alg": "HS256", "typ": "JWT"}, {"user_id": user_id, "exp": 1})),
+                ("Two-Segment", "a.b"),
+                ("Non-Base64", "!!not*base64!!.@@.##")
+            ]
+            responses = self._fan_out(
+                lambda case: self.session.get(f"{self.base_url}/profile", headers={"Authorization": f"Bearer {case[1]}"}),
+                cases
+            )
+        except Exception as e:
+            self.log_result("Invalid Token Rejection", False, f"Exception: {str(e)}")
+            return
+        
+        for (name, _), response in zip(cases, responses):
+            test_name = f"Invalid Token Rejection ({name})"
+            if response.status_code == 401:
+                self.log_result(test_name, True, "Correctly rejected with 401")
+            else:
+                self.log_result(test_name, False, f"Should reject with 401, got {response.status_code}", response)
+    
     def test_location_update(self):
         """Test location update endpoint"""
-        print("📍 Testing Location Services...")
-        
         if not self.auth_tokens:
             self.log_result("Location Update", False, "No auth tokens available")
             return
         
-        user_id = list(self.auth_tokens.keys())[0]
-        token = self.auth_tokens[user_id]
-        auth_headers = self.headers.copy()
-        auth_headers["Authorization"] = f"Bearer {token}"
+        user_id = self.primary_user_id
+        auth_headers = self.auth_headers[user_id]
         
-        location_data = {
-            "latitude": 37.7749,  # San Francisco coordinates
-            "longitude": -122.4194,
-            "user_id": user_id
-        }
+        location_data = {**PRIMARY_LOCATION, "user_id": user_id}
         
         try:
-            response = requests.post(f"{self.base_url}/location", json=location_data, headers=auth_headers)
+            # Reuse the update create_users already sent alongside the
+            # nearby users', rather than POSTing the same point again
+            response = self.primary_location_response
+            if response is None:
+                response = self._post_json(f"{self.base_url}/location", location_data, auth_headers)
             
             if response.status_code == 200:
                 self.log_result("Location Update", True, "Location updated successfully")
@@ -263,10 +540,8 @@ class NearbyConnectTester:
         if not self.auth_tokens:
             return
         
-        user_id = list(self.auth_tokens.keys())[0]
-        token = self.auth_tokens[user_id]
-        auth_headers = self.headers.copy()
-        auth_headers["Authorization"] = f"Bearer {token}"
+        user_id = self.primary_user_id
+        auth_headers = self.auth_headers[user_id]
         
         invalid_location = {
             "latitude": 200,  # Invalid latitude
@@ -275,7 +550,7 @@ class NearbyConnectTester:
         }
         
         try:
-            response = requests.post(f"{self.base_url}/location", json=invalid_location, headers=auth_headers)
+            response = self._post_json(f"{self.base_url}/location", invalid_location, auth_headers)
             if response.status_code == 422:  # Validation error
                 self.log_result("Invalid Location Validation", True, "Correctly rejected invalid coordinates")
             else:
@@ -283,78 +558,140 @@ class NearbyConnectTester:
         except Exception as e:
             self.log_result("Invalid Location Validation", False, f"Exception: {str(e)}")
     
-    def create_second_user(self):
-        """Create a second user for nearby users testing"""
-        test_user2 = {
-            "name": "Bob Smith",
-            "email": f"bob.test.{int(time.time())}@example.com",
-            "phone": "+1987654321"
-        }
+    def _fan_out(self, fn, items):
+        """Apply fn to every item concurrently, returning results in order"""
+        with ThreadPoolExecutor(max_workers=max(1, min(len(items), MAX_CONCURRENCY))) as executor:
+            return list(executor.map(fn, items))
+    
+    def _load_cached_users(self, n):
+        """Users cached for BASE_URL by an earlier run, if there are n whose tokens still work"""
+        if BACKEND_MOCK:
+            # Replay whatever cache state the recorded run saw
+            cached = self._fixtures.get("cached_users")
+        else:
+            try:
+                with open(USER_CACHE_PATH, "rb") as f:
+                    cached = orjson.loads(f.read()).get(self.base_url)
+            except (OSError, orjson.JSONDecodeError):
+                cached = None
+            self._cached_users = cached
+        if not cached or len(cached) < n:
+            return None
         
+        cached = cached[:n]
+        checks = self._fan_out(
+            lambda user: self.session.get(
+                f"{self.base_url}/profile", headers={"Authorization": f"Bearer {user['token']}"}
+            ),
+            cached
+        )
+        if any(response.status_code != 200 for response in checks):
+            return None
+        return cached
+    
+    def _save_cached_users(self, users):
+        """Cache verified users under BASE_URL so later runs can skip signup"""
+        if BACKEND_MOCK:
+            return
         try:
-            # Signup
-            response = requests.post(f"{self.base_url}/auth/signup", json=test_user2, headers=self.headers)
-            if response.status_code == 200:
-                data = response.json()
-                user_info = {
-                    "user_data": test_user2,
-                    "user_id": data["user_id"],
-                    "verification_code": data["verification_code"]
-                }
-                
-                # Verify
-                verification_data = {
-                    "user_id": user_info["user_id"],
-                    "verification_code": user_info["verification_code"]
-                }
-                verify_response = requests.post(f"{self.base_url}/auth/verify", json=verification_data, headers=self.headers)
-                
-                if verify_response.status_code == 200:
-                    verify_data = verify_response.json()
-                    self.auth_tokens[user_info["user_id"]] = verify_data["token"]
-                    self.test_users.append(user_info)
-                    
-                    # Update location for second user (nearby to first user)
-                    auth_headers = self.headers.copy()
-                    auth_headers["Authorization"] = f"Bearer {verify_data['token']}"
-                    
-                    location_data = {
-                        "latitude": 37.7849,  # Close to first user
-                        "longitude": -122.4094,
-                        "user_id": user_info["user_id"]
-                    }
-                    
-                    requests.post(f"{self.base_url}/location", json=location_data, headers=auth_headers)
-                    return True
+            with open(USER_CACHE_PATH, "rb") as f:
+                cache = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            cache = {}
+        cache[self.base_url] = users
+        with open(USER_CACHE_PATH, "wb") as f:
+            f.write(orjson.dumps(cache, option=orjson.OPT_INDENT_2))
+    
+    def _signup_users(self, new_users):
+        """Sign up and verify new_users, returning them with their tokens, or None"""
+        # Each step is one concurrent fan-out, so this costs two round
+        # trips no matter how many users are created
+        
+        # Signup
+        signups = self._fan_out(
+            lambda user: self._post_json(f"{self.base_url}/auth/signup", user), new_users
+        )
+        user_infos = []
+        for user, response in zip(new_users, signups):
+            if response.status_code != 200:
+                return None
+            data = orjson.loads(response.content)
+            user_infos.append({
+                "user_data": user,
+                "user_id": data["user_id"],
+                "verification_code": data["verification_code"]
+            })
+        
+        # Verify
+        verifies = self._fan_out(
+            lambda info: self._post_json(f"{self.base_url}/auth/verify", {
+                "user_id": info["user_id"],
+                "verification_code": info["verification_code"]
+            }),
+            user_infos
+        )
+        for info, response in zip(user_infos, verifies):
+            if response.status_code != 200:
+                return None
+            info["token"] = orjson.loads(response.content)["token"]
+        return user_infos
+    
+    def create_users(self, n=NEARBY_USER_COUNT):
+        """Create n verified users near the first user for nearby users testing"""
+        try:
+            # Reuse the users cached by an earlier run; signup and verify
+            # themselves are covered by the primary user's tests
+            user_infos = self._load_cached_users(n)
+            if user_infos is None:
+                user_infos = self._signup_users([{
+                    "name": "Bob Smith" if i == 0 else f"Nearby User {i + 1}",
+                    "email": f"bob.test.{self.run_id}.{i}@example.com",
+                    "phone": "+1987654321"
+                } for i in range(n)])
+                if user_infos is None:
+                    return False
+                self._save_cached_users(user_infos)
+            
+            for info in user_infos:
+                self.set_auth_token(info["user_id"], info["token"])
+                self.test_users.append(info)
+            
+            # Update every user's location concurrently (new users close to the first user)
+            primary_id = self.primary_user_id
+            locations = [(primary_id, {**PRIMARY_LOCATION, "user_id": primary_id})]
+            for i, info in enumerate(user_infos):
+                locations.append((info["user_id"], {
+                    "latitude": 37.7849,  # Close to first user
+                    "longitude": -122.4094 + 0.001 * i,
+                    "user_id": info["user_id"]
+                }))
+            location_responses = self._fan_out(
+                lambda entry: self._post_json(f"{self.base_url}/location", entry[1], self.auth_headers[entry[0]]),
+                locations
+            )
+            self.primary_location_response = location_responses[0]
+            return True
         except Exception as e:
-            print(f"Error creating second user: {str(e)}")
+            self._log_lines.append(f"Error creating nearby users: {str(e)}")
         
         return False
     
     def test_nearby_users(self):
         """Test nearby users search"""
         if len(self.auth_tokens) < 2:
-            # Create second user
-            if not self.create_second_user():
-                self.log_result("Nearby Users Search", False, "Could not create second user for testing")
+            # Create nearby users
+            if not self.create_users():
+                self.log_result("Nearby Users Search", False, "Could not create nearby users for testing")
                 return
         
-        user_id = list(self.auth_tokens.keys())[0]
-        token = self.auth_tokens[user_id]
-        auth_headers = self.headers.copy()
-        auth_headers["Authorization"] = f"Bearer {token}"
-        
-        nearby_request = {
-            "latitude": 37.7749,
-            "longitude": -122.4194,
-            "radius_miles": 2.0
-        }
+        user_id = self.primary_user_id
+        auth_headers = self.auth_headers[user_id]
         
         try:
-            response = requests.post(f"{self.base_url}/users/nearby", json=nearby_request, headers=auth_headers)
+            response = self.session.post(f"{self.base_url}/users/nearby", data=NEARBY_REQUEST_BODY, headers=auth_headers)
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if "nearby_users" in data:
                     nearby_count = len(data["nearby_users"])
                     self.log_result("Nearby Users Search", True, f"Found {nearby_count} nearby users")
@@ -367,19 +704,15 @@ class NearbyConnectTester:
     
     def test_messaging(self):
         """Test messaging system"""
-        print("💬 Testing Messaging System...")
-        
         if len(self.auth_tokens) < 2:
             self.log_result("Send Message", False, "Need at least 2 users for messaging test")
             return
         
-        user_ids = list(self.auth_tokens.keys())
+        user_ids = self.user_order
         sender_id = user_ids[0]
         recipient_id = user_ids[1]
         
-        token = self.auth_tokens[sender_id]
-        auth_headers = self.headers.copy()
-        auth_headers["Authorization"] = f"Bearer {token}"
+        auth_headers = self.auth_headers[sender_id]
         
         message_data = {
             "content": "Hello! This is a test message from the API test suite.",
@@ -387,10 +720,10 @@ class NearbyConnectTester:
         }
         
         try:
-            response = requests.post(f"{self.base_url}/messages", json=message_data, headers=auth_headers)
+            response = self._post_json(f"{self.base_url}/messages", message_data, auth_headers)
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if "message_id" in data:
                     self.log_result("Send Message", True, f"Message sent successfully with ID: {data['message_id']}")
                 else:
@@ -405,32 +738,92 @@ class NearbyConnectTester:
         if len(self.auth_tokens) < 2:
             return
         
-        user_ids = list(self.auth_tokens.keys())
+        user_ids = self.user_order
         sender_id = user_ids[0]
         recipient_id = user_ids[1]
         
-        token = self.auth_tokens[sender_id]
-        auth_headers = self.headers.copy()
-        auth_headers["Authorization"] = f"Bearer {token}"
-        
-        # Small base64 encoded test image
-        test_image = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+        auth_headers = self.auth_headers[sender_id]
         
         message_data = {
             "content": "Test message with image",
             "recipient_ids": [recipient_id],
-            "image_data": test_image
+            "image_data": TEST_PNG_B64
         }
         
         try:
-            response = requests.post(f"{self.base_url}/messages", json=message_data, headers=auth_headers)
+            response = self._post_json(f"{self.base_url}/messages", message_data, auth_headers)
             
             if response.status_code == 200:
+                message_id = orjson.loads(response.content)["message_id"]
                 self.log_result("Send Message with Image", True, "Message with image sent successfully")
             else:
                 self.log_result("Send Message with Image", False, f"Send message with image failed with status: {response.status_code}", response)
+                return
         except Exception as e:
             self.log_result("Send Message with Image", False, f"Exception: {str(e)}")
+            return
+        
+        self._check_message_image(message_id, sender_id, recipient_id)
+    
+    def _outsider_headers(self, *member_ids):
+        """Authorization header of a verified user who is none of member_ids, or None"""
+        for user_id in self.user_order:
+            if user_id not in member_ids:
+                return self.auth_headers[user_id]
+        
+        # Only the conversation's own users exist, so sign up one more
+        outsiders = self._signup_users([{
+            "name": "Carol Outsider",
+            "email": f"carol.test.{self.run_id}@example.com",
+            "phone": "+1555123456"
+        }])
+        if outsiders is None:
+            return None
+        return {"Authorization": f"Bearer {outsiders[0]['token']}"}
+    
+    def _check_message_image(self, message_id, sender_id, recipient_id):
+        """Test downloading a message image as the sender and as an unrelated user"""
+        auth_headers = self.auth_headers[sender_id]
+        image_url = f"{self.base_url}/messages/{message_id}/image"
+        
+        try:
+            response = self.session.get(f"{self.base_url}/messages", headers=auth_headers)
+            if response.status_code != 200:
+                self.log_result("Fetch Message Image", False, f"Get messages failed with status: {response.status_code}", response)
+                return
+            message = next(
+                (message for message in orjson.loads(response.content)["messages"] if message["id"] == message_id),
+                None
+            )
+            if message is None or not message.get("image_id"):
+                self.log_result("Fetch Message Image", False, "Sent message or its image_id missing from messages", response)
+                return
+            
+            response = self.session.get(image_url, headers=auth_headers)
+            if response.status_code != 200:
+                self.log_result("Fetch Message Image", False, f"Image download failed with status: {response.status_code}", response)
+            elif not response.headers.get("Content-Type", "").startswith("image/png"):
+                self.log_result("Fetch Message Image", False, f"Unexpected Content-Type: {response.headers.get('Content-Type')}")
+            elif response.content != TEST_PNG_BYTES:
+                self.log_result("Fetch Message Image", False, f"Image bytes differ from the upload ({len(response.content)} bytes)")
+            else:
+                self.log_result("Fetch Message Image", True, f"Sender downloaded image {message['image_id']}")
+        except Exception as e:
+            self.log_result("Fetch Message Image", False, f"Exception: {str(e)}")
+        
+        try:
+            outsider_headers = self._outsider_headers(sender_id, recipient_id)
+            if outsider_headers is None:
+                self.log_result("Message Image Access Control", False, "Could not create a user outside the conversation")
+                return
+            
+            response = self.session.get(image_url, headers=outsider_headers)
+            if response.status_code == 404:
+                self.log_result("Message Image Access Control", True, "Correctly hid the image from an unrelated user")
+            else:
+                self.log_result("Message Image Access Control", False, f"Unrelated user should get 404, got {response.status_code}", response)
+        except Exception as e:
+            self.log_result("Message Image Access Control", False, f"Exception: {str(e)}")
     
     def test_get_messages(self):
         """Test retrieving messages"""
@@ -438,43 +831,114 @@ class NearbyConnectTester:
             self.log_result("Get Messages", False, "No auth tokens available")
             return
         
-        user_id = list(self.auth_tokens.keys())[0]
-        token = self.auth_tokens[user_id]
-        auth_headers = self.headers.copy()
-        auth_headers["Authorization"] = f"Bearer {token}"
+        user_id = self.primary_user_id
+        auth_headers = self.auth_headers[user_id]
         
         try:
-            response = requests.get(f"{self.base_url}/messages", headers=auth_headers)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "messages" in data:
-                    message_count = len(data["messages"])
-                    self.log_result("Get Messages", True, f"Retrieved {message_count} messages")
+            # Only the message count is checked, so stream the body and count
+            # array items as they are parsed rather than building the whole page
+            with self.session.get(f"{self.base_url}/messages", headers=auth_headers, stream=True) as response:
+                if response.status_code == 200:
+                    response.raw.decode_content = True
+                    message_count = None
+                    for prefix, event, _ in ijson.parse(response.raw):
+                        if (prefix, event) == ("messages", "start_array"):
+                            message_count = 0
+                        elif (prefix, event) == ("messages.item", "start_map"):
+                            message_count += 1
+                    if message_count is not None:
+                        self.log_result("Get Messages", True, f"Retrieved {message_count} messages")
+                    else:
+                        self.log_result("Get Messages", False, "Missing messages in response")
                 else:
-                    self.log_result("Get Messages", False, "Missing messages in response", response)
-            else:
-                self.log_result("Get Messages", False, f"Get messages failed with status: {response.status_code}", response)
+                    self.log_result("Get Messages", False, f"Get messages failed with status: {response.status_code}", response)
         except Exception as e:
             self.log_result("Get Messages", False, f"Exception: {str(e)}")
     
+    def test_message_pagination(self):
+        """Test that walking GET /messages by next_cursor neither repeats nor skips messages"""
+        if len(self.auth_tokens) < 2:
+            self.log_result("Message Pagination", False, "Need at least 2 users for pagination test")
+            return
+        
+        sender_id = self.user_order[0]
+        recipient_id = self.user_order[1]
+        auth_headers = self.auth_headers[sender_id]
+        
+        try:
+            # Sent concurrently, so several are likely to land on the same
+            # millisecond and exercise the before_id tie-break
+            sends = self._fan_out(
+                lambda i: self._post_json(f"{self.base_url}/messages", {
+                    "content": f"Pagination test message {i}",
+                    "recipient_ids": [recipient_id]
+                }, auth_headers),
+                range(PAGINATION_BURST)
+            )
+            failed = next((response for response in sends if response.status_code != 200), None)
+            if failed is not None:
+                self.log_result("Message Pagination", False, f"Send message failed with status: {failed.status_code}", failed)
+                return
+            burst_ids = {orjson.loads(response.content)["message_id"] for response in sends}
+            
+            response = self.session.get(
+                f"{self.base_url}/messages", params={"limit": MESSAGES_PAGE_SIZE}, headers=auth_headers
+            )
+            if response.status_code != 200:
+                self.log_result("Message Pagination", False, f"Get messages failed with status: {response.status_code}", response)
+                return
+            expected = orjson.loads(response.content)["messages"]
+            if len(expected) == MESSAGES_PAGE_SIZE:
+                self.log_result("Message Pagination", False, "Sender has too many messages to check against a single page")
+                return
+            ties = sum(a["timestamp"] == b["timestamp"] for a, b in zip(expected, expected[1:]))
+            
+            paged_ids = []
+            params = {"limit": PAGINATION_PAGE_SIZE}
+            pages = 0
+            # Stop one page past the expected count so a looping cursor fails instead of hanging
+            while params is not None and pages <= len(expected) // PAGINATION_PAGE_SIZE + 1:
+                response = self.session.get(f"{self.base_url}/messages", params=params, headers=auth_headers)
+                if response.status_code != 200:
+                    self.log_result("Message Pagination", False, f"Page {pages + 1} failed with status: {response.status_code}", response)
+                    return
+                data = orjson.loads(response.content)
+                paged_ids.extend(message["id"] for message in data["messages"])
+                pages += 1
+                cursor = data.get("next_cursor")
+                params = {"limit": PAGINATION_PAGE_SIZE, **cursor} if cursor else None
+            
+            expected_ids = [message["id"] for message in expected]
+            if paged_ids != expected_ids:
+                repeated = len(paged_ids) - len(set(paged_ids))
+                skipped = len(set(expected_ids) - set(paged_ids))
+                self.log_result("Message Pagination", False, f"Pages differ from the full list: {repeated} repeated, {skipped} skipped")
+            elif not burst_ids <= set(paged_ids):
+                self.log_result("Message Pagination", False, "Pages are missing messages sent by this test")
+            else:
+                self.log_result("Message Pagination", True, f"Walked {len(paged_ids)} messages in {pages} pages across {ties} timestamp ties")
+            
+            response = self.session.get(
+                f"{self.base_url}/messages", params={"before_id": expected_ids[0]}, headers=auth_headers
+            )
+            if response.status_code == 400:
+                self.log_result("Pagination Cursor Validation", True, "Correctly rejected before_id without before")
+            else:
+                self.log_result("Pagination Cursor Validation", False, f"Should reject before_id without before, got {response.status_code}", response)
+        except Exception as e:
+            self.log_result("Message Pagination", False, f"Exception: {str(e)}")
+    
     def test_preferences_update(self):
         """Test user preferences update"""
         if not self.auth_tokens:
             self.log_result("Update Preferences", False, "No auth tokens available")
             return
         
-        user_id = list(self.auth_tokens.keys())[0]
-        token = self.auth_tokens[user_id]
-        auth_headers = self.headers.copy()
-        auth_headers["Authorization"] = f"Bearer {token}"
-        
-        preferences_data = {
-            "preferences": ["music", "travel", "technology", "fitness"]
-        }
+        user_id = self.primary_user_id
+        auth_headers = self.auth_headers[user_id]
         
         try:
-            response = requests.put(f"{self.base_url}/preferences", json=preferences_data, headers=auth_headers)
+            response = self.session.put(f"{self.base_url}/preferences", data=PREFERENCES_BODY, headers=auth_headers)
             
             if response.status_code == 200:
                 self.log_result("Update Preferences", True, "Preferences updated successfully")
@@ -483,46 +947,91 @@ class NearbyConnectTester:
         except Exception as e:
             self.log_result("Update Preferences", False, f"Exception: {str(e)}")
     
+    def run_phase(self, *tests):
+        """Run independent tests concurrently over the shared session"""
+        with ThreadPoolExecutor(max_workers=min(len(tests), MAX_CONCURRENCY)) as executor:
+            for future in [executor.submit(test) for test in tests]:
+                future.result()
+    
     def run_all_tests(self):
         """Run all backend API tests"""
-        print("🚀 Starting Nearby Connect Backend API Tests")
-        print(f"Testing against: {self.base_url}")
-        print("=" * 60)
-        
-        # Authentication Tests
-        self.test_user_signup()
-        self.test_invalid_signup()
-        self.test_user_verification()
-        self.test_invalid_verification()
-        self.test_user_login()
-        self.test_profile_access()
-        self.test_profile_update()
-        self.test_unauthorized_access()
-        
-        # Location Tests
-        self.test_location_update()
-        self.test_invalid_location()
-        self.test_nearby_users()
-        
-        # Messaging Tests
-        self.test_messaging()
-        self.test_message_with_image()
-        self.test_get_messages()
-        
-        # Preferences Tests
-        self.test_preferences_update()
-        
-        # Summary
-        print("=" * 60)
-        print("🏁 TEST SUMMARY")
-        print(f"✅ Passed: {self.test_results['passed']}")
-        print(f"❌ Failed: {self.test_results['failed']}")
-        print(f"📊 Success Rate: {(self.test_results['passed'] / (self.test_results['passed'] + self.test_results['failed']) * 100):.1f}%")
-        
-        if self.test_results['errors']:
-            print("\n🔍 FAILED TESTS DETAILS:")
-            for error in self.test_results['errors']:
-                print(f"- {error['test']}: {error['message']}")
+        self._log_lines.append("🚀 Starting Nearby Connect Backend API Tests")
+        self._log_lines.append(f"Testing against: {self.base_url}")
+        self._log_lines.append("=" * 60)
+        
+        mock = replay_mock(self._fixtures) if BACKEND_MOCK else None
+        if mock is not None:
+            self._log_lines.append(f"Replaying recorded responses from: {FIXTURES_PATH}")
+            mock.start()
+        
+        # Report whatever ran even if a phase raises or the run is interrupted
+        try:
+            # Tests within a phase are independent of each other and run
+            # concurrently; each phase only depends on state from earlier phases
+            self._log_lines.append("🔐 Testing Authentication System...")
+            self.run_phase(
+                self.test_user_signup,
+                self.test_invalid_signup,
+                self.test_unauthorized_access
+            )
+            self.run_phase(
+                self.test_user_verification,
+                self.test_invalid_verification
+            )
+            
+            # Profile, Location and Preferences Tests
+            self._log_lines.append("📍 Testing Location Services...")
+            self.run_phase(
+                self.create_users,
+                self.test_user_login,
+                self.test_profile_update,
+                self.test_invalid_location,
+                self.test_invalid_tokens,
+                self.test_preferences_update
+            )
+            
+            # Location, Nearby and Messaging Tests (need both users)
+            self._log_lines.append("💬 Testing Messaging System...")
+            self.run_phase(
+                self.test_location_update,
+                self.test_nearby_users,
+                self.test_messaging,
+                self.test_message_with_image
+            )
+            
+            # Read-only checks run last, together, so they observe every write above
+            self.run_phase(
+                self.test_profile_access,
+                self.test_get_messages
+            )
+            
+            # Pagination sends its own burst of messages, so it runs after the read-only checks
+            self.run_phase(self.test_message_pagination)
+        finally:
+            if mock is not None:
+                mock.stop()
+                mock.reset()
+            else:
+                self.save_fixtures()
+            
+            # Summary
+            passed = self.test_results['passed']
+            total = passed + self.test_results['failed']
+            success_rate = passed / total * 100 if total else 0.0
+            self._log_lines.append("=" * 60)
+            self._log_lines.append("🏁 TEST SUMMARY")
+            self._log_lines.append(f"✅ Passed: {passed}")
+            self._log_lines.append(f"❌ Failed: {self.test_results['failed']}")
+            self._log_lines.append(f"📊 Success Rate: {success_rate:.1f}%")
+            
+            if self.test_results['errors']:
+                self._log_lines.append("\n🔍 FAILED TESTS DETAILS:")
+                for error in self.test_results['errors']:
+                    self._log_lines.append(f"- {error['test']}: {error['message']}")
+            
+            # Emit the whole report in one write instead of a syscall per line
+            sys.stdout.write("\n".join(self._log_lines) + "\n")
+            sys.stdout.flush()
         
         return self.test_results
 
@@ -3,40 +3,58 @@
 Test Frontend Signup Flow - Simulate exact frontend behavior
 """
 
+import atexit
 import requests
-import json
-import time
+import secrets
 from datetime import datetime
 
+# orjson when it is installed (faster parse and pretty-print), stdlib json otherwise
+try:
+    import orjson
+    
+    json_loads = orjson.loads
+    
+    def json_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    import json
+    
+    json_loads = json.loads
+    
+    def json_dumps(obj):
+        return json.dumps(obj, indent=2)
+
 BASE_URL = "https://radius-chat.preview.emergentagent.com/api"
 
+# One keep-alive session for the whole flow, set up the way the frontend
+# sends requests, so verify and the duplicate check reuse the connection
+SESSION = requests.Session()
+SESSION.headers['Content-Type'] = 'application/json'
+atexit.register(SESSION.close)
+
 def test_frontend_signup_flow():
     """Test the exact signup flow as the frontend would do it"""
     print("🔍 TESTING FRONTEND SIGNUP FLOW")
     print("=" * 60)
     
     # Generate unique email to avoid "User already exists" error
-    timestamp = int(time.time())
+    # Random rather than time-based, so reruns within a second or parallel runs never collide
+    suffix = secrets.token_hex(4)
     test_data = {
         "name": "Test User",
-        "email": f"test.user.{timestamp}@example.com",
+        "email": f"test.user.{suffix}@example.com",
         "phone": "1234567890"
     }
     
     print(f"Testing with fresh email: {test_data['email']}")
-    print(f"Payload: {json.dumps(test_data, indent=2)}")
-    
-    # Simulate exact frontend request
-    headers = {
-        'Content-Type': 'application/json',
-    }
+    print(f"Payload: {json_dumps(test_data)}")
     
+    # Simulate exact frontend request (headers come from SESSION)
     try:
         print(f"\nSending POST request to: {BASE_URL}/auth/signup")
-        response = requests.post(
+        response = SESSION.post(
             f"{BASE_URL}/auth/signup",
             json=test_data,
-            headers=headers,
             timeout=10
         )
         
@@ -44,8 +62,8 @@ def test_frontend_signup_flow():
         print(f"Response Headers: {dict(response.headers)}")
         
         try:
-            response_json = response.json()
-            print(f"Response Body: {json.dumps(response_json, indent=2)}")
+            response_json = json_loads(response.content)
+            print(f"Response Body: {json_dumps(response_json)}")
         except:
             print(f"Response Body (raw): {response.text}")
         
@@ -60,17 +78,16 @@ def test_frontend_signup_flow():
                     "verification_code": response_json['verification_code']
                 }
                 
-                verify_response = requests.post(
+                verify_response = SESSION.post(
                     f"{BASE_URL}/auth/verify",
                     json=verify_data,
-                    headers=headers,
                     timeout=10
                 )
                 
                 print(f"Verify Status: {verify_response.status_code}")
                 if verify_response.status_code == 200:
                     print("✅ VERIFICATION SUCCESS")
-                    verify_json = verify_response.json()
+                    verify_json = json_loads(verify_response.content)
                     print(f"Token received: {verify_json.get('token', 'N/A')[:20]}...")
                 else:
                     print("❌ VERIFICATION FAILED")
@@ -80,7 +97,7 @@ def test_frontend_signup_flow():
         elif response.status_code == 400:
             print("❌ 400 BAD REQUEST")
             try:
-                error_data = response.json()
+                error_data = json_loads(response.content)
                 print(f"Error: {error_data.get('detail', 'Unknown error')}")
             except:
                 pass
@@ -107,13 +124,10 @@ def test_duplicate_signup():
     
     print(f"Testing with existing email: {duplicate_data['email']}")
     
-    headers = {'Content-Type': 'application/json'}
-    
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{BASE_URL}/auth/signup",
             json=duplicate_data,
-            headers=headers,
             timeout=10
         )
         
@@ -122,7 +136,7 @@ def test_duplicate_signup():
         if response.status_code == 400:
             print("✅ CORRECTLY REJECTED DUPLICATE EMAIL")
             try:
-                error_data = response.json()
+                error_data = json_loads(response.content)
                 print(f"Error Message: {error_data.get('detail', 'Unknown')}")
             except:
                 pass
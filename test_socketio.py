@@ -16,10 +16,12 @@ async def test_socketio():
     
     # Create Socket.IO client
     sio = socketio.AsyncClient()
+    connected = asyncio.Event()
     
     @sio.event
     async def connect():
         print("✅ Socket.IO connected successfully")
+        connected.set()
     
     @sio.event
     async def disconnect():
@@ -33,14 +35,11 @@ async def test_socketio():
         # Connect to Socket.IO server
         await sio.connect(BASE_URL)
         
-        # Wait a bit to ensure connection
-        await asyncio.sleep(2)
+        # Wait for the connect handler rather than a fixed delay
+        await asyncio.wait_for(connected.wait(), timeout=5)
         
-        # Test joining a room
-        await sio.emit('join_location_updates', {'user_id': 'test-user-123'})
-        
-        # Wait a bit more
-        await asyncio.sleep(2)
+        # Test joining a room; call() returns as soon as the server acks
+        await sio.call('join_location_updates', {'user_id': 'test-user-123'}, timeout=5)
         
         print("✅ Socket.IO basic functionality working")
         